@@ -1,19 +1,57 @@
 from __future__ import absolute_import, print_function
 
 import atexit
+import copy
 import signal
+import struct
+import sys
 import os
 import click
-from six import text_type
-from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from sentry.utils.compat import map
+from sentry.utils.compat import functools
 
+# The heavy imports (docker, django settings, sentry.runner.configure) are
+# deferred so that `devservices --help` and friends don't pay for them, but
+# memoized so repeated callers don't re-run the importlib machinery.
 
-def get_docker_client():
+
+@functools.lru_cache(maxsize=None)
+def _docker():
     import docker
 
+    return docker
+
+
+@functools.lru_cache(maxsize=None)
+def _settings():
+    from django.conf import settings
+
+    return settings
+
+
+_configured = False
+
+
+def _configure():
+    global _configured
+    if _configured:
+        return
+    from sentry.runner import configure
+
+    configure()
+    _configured = True
+
+
+@functools.lru_cache(maxsize=1)
+def get_docker_client():
+    docker = _docker()
+
     client = docker.from_env()
+    # The ping round-trip only exists to produce a friendly error message;
+    # it can be skipped when the caller knows the daemon is up.
+    if os.environ.get("SENTRY_DEVSERVICES_SKIP_PING") == "1":
+        return client
     try:
         client.ping()
         return client
@@ -21,8 +59,68 @@ def get_docker_client():
         raise click.ClickException("Make sure Docker is running.")
 
 
+def _demux_docker_stream(fp, out):
+    # The attach socket speaks docker's stream multiplex protocol: an 8 byte
+    # header carrying the payload length, then the payload. Copying payloads
+    # straight to the output byte stream avoids the per-chunk Python framing
+    # that the docker-py logs() generator does. Truncated headers and EOF
+    # mid-payload both just end the stream.
+    while True:
+        header = fp.read(8)
+        if len(header) < 8:
+            return
+        size = struct.unpack(">BxxxL", header)[1]
+        while size > 0:
+            chunk = fp.read(min(size, 65536))
+            if not chunk:
+                return
+            out.write(chunk)
+            size -= len(chunk)
+        out.flush()
+
+
+def _stream_container_logs(container):
+    # py2 file objects have no .buffer; write to the stream itself there.
+    stdout = getattr(sys.stdout, "buffer", sys.stdout)
+
+    try:
+        sock = container.attach_socket(params={"stdout": 1, "stderr": 1, "stream": 1, "logs": 1})
+        # docker-py hands back a SocketIO for plain unix/tcp transports but
+        # the raw ssl/npipe socket otherwise, so normalize before poking it.
+        raw = getattr(sock, "_sock", sock)
+        raw.setblocking(True)
+        fp = raw.makefile("rb")
+    except Exception:
+        # Older daemons/SDKs or transports without a usable raw socket;
+        # fall back to the (slower) generator wrapper, writing bytes
+        # directly so each line skips click's echo machinery.
+        for line in container.logs(stream=True):
+            stdout.write(line)
+            stdout.flush()
+        return
+
+    _demux_docker_stream(fp, stdout)
+
+
+def get_local_image_tags(client):
+    # A single images.list() round-trip is much cheaper than asking the
+    # daemon about every service's image individually.
+    return {tag for image in client.images.list() for tag in (image.tags or [])}
+
+
+def _matching_containers(client, prefix, service):
+    # The daemon-side name filter matches substrings, so it cuts the
+    # payload down but the startswith check is still needed for exactness.
+    return [
+        container
+        for container in client.containers.list(all=True, filters={"name": prefix})
+        if container.name.startswith(prefix)
+        and (not service or container.name[len(prefix) :] in service)
+    ]
+
+
 def get_or_create(client, thing, name):
-    import docker
+    docker = _docker()
 
     try:
         return getattr(client, thing + "s").get(name)
@@ -34,12 +132,10 @@ def get_or_create(client, thing, name):
 def ensure_interface(ports):
     # If there is no interface specified, make sure the
     # default interface is 127.0.0.1
-    rv = {}
-    for k, v in ports.items():
-        if not isinstance(v, tuple):
-            v = ("127.0.0.1", v)
-        rv[k] = v
-    return rv
+    if all(isinstance(v, tuple) for v in ports.values()):
+        # Nothing to rewrite; hand back the same dict to skip the copy.
+        return ports
+    return {k: v if isinstance(v, tuple) else ("127.0.0.1", v) for k, v in ports.items()}
 
 
 @click.group()
@@ -68,11 +164,11 @@ def attach(project, is_devserver, service):
     for that.
     """
 
-    os.environ["SENTRY_SKIP_BACKEND_VALIDATION"] = "1"
+    # setdefault so a value exported by the caller wins; configure() reads
+    # this while bootstrapping settings to skip the backend validation.
+    os.environ.setdefault("SENTRY_SKIP_BACKEND_VALIDATION", "1")
 
-    from sentry.runner import configure
-
-    configure()
+    _configure()
 
     client = get_docker_client()
     containers = _prepare_containers(project)
@@ -91,8 +187,7 @@ def attach(project, is_devserver, service):
     signal.signal(signal.SIGINT, exit_handler)
     signal.signal(signal.SIGTERM, exit_handler)
 
-    for line in container.logs(stream=True):
-        click.echo(line, nl=False)
+    _stream_container_logs(container)
 
 
 @devservices.command()
@@ -104,15 +199,15 @@ def up(project, exclude, fast):
     Run/update dependent services.
     """
 
-    os.environ["SENTRY_SKIP_BACKEND_VALIDATION"] = "1"
-
-    exclude = set(chain.from_iterable(x.split(",") for x in exclude))
+    # setdefault so a value exported by the caller wins; configure() reads
+    # this while bootstrapping settings to skip the backend validation.
+    os.environ.setdefault("SENTRY_SKIP_BACKEND_VALIDATION", "1")
 
-    from sentry.runner import configure
+    # One join + split instead of a chain of per-option lists; the ""
+    # subtraction handles both no options and empty segments.
+    exclude = set(",".join(exclude).split(",")) - {""}
 
-    configure()
-
-    from django.conf import settings
+    _configure()
 
     client = get_docker_client()
 
@@ -127,80 +222,162 @@ def up(project, exclude, fast):
             fg="red",
         )
 
-    for name, options in settings.SENTRY_DEVSERVICES.items():
-        if name in exclude:
-            continue
-
-        if name not in containers:
+    # containers already reflects the only_if-filtered service list.
+    targets = [name for name in containers if name not in exclude]
+
+    if not targets:
+        return
+
+    # One list() call instead of an images.get() round-trip per service.
+    local_images = None if fast else get_local_image_tags(client)
+
+    # Likewise one volumes.list() instead of a volumes.get() per mount.
+    known_volumes = {v.name for v in client.volumes.list(filters={"name": project + "_"})}
+
+    if local_images is not None:
+        to_pull = {
+            containers[name]["image"]
+            for name in targets
+            if containers[name].get("pull") or containers[name]["image"] not in local_images
+        }
+        if to_pull:
+
+            def _pull(image):
+                click.secho("> Pulling image '%s'" % image, err=True, fg="green")
+                client.images.pull(image)
+
+            # Pulls are registry-bound, so overlap them, but cap concurrency
+            # to avoid saturating the registry.
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                for future in as_completed(executor.submit(_pull, image) for image in to_pull):
+                    future.result()
+            local_images |= to_pull
+
+    # Startup is dominated by waiting on the docker daemon (image pulls,
+    # container starts), so overlap the services instead of paying each
+    # one's latency serially.
+    with ThreadPoolExecutor(max_workers=min(8, len(targets))) as executor:
+        futures = {
+            executor.submit(
+                _start_service,
+                client,
+                name,
+                containers,
+                project,
+                fast=fast,
+                local_images=local_images,
+                known_volumes=known_volumes,
+            ): name
+            for name in targets
+        }
+        for future in as_completed(futures):
+            future.result()
+
+
+def _filtered_devservices(settings, sentry_options):
+    # Deliberately uncached: the only_if closures read live settings and
+    # option-store values, so a memoized result can go stale under
+    # override_settings or option changes.
+    services = []
+    devservices = settings.SENTRY_DEVSERVICES
+    for name, options in devservices.items():
+        test_fn = options.get("only_if")
+        if test_fn and not test_fn(settings, sentry_options):
+            click.secho("! Skipping {} due to only_if condition".format(name), err=True, fg="cyan")
             continue
-
-        _start_service(client, name, containers, project, fast=fast)
+        services.append((name, options))
+    return tuple(services)
 
 
 def _prepare_containers(project):
-    from django.conf import settings
     from sentry import options as sentry_options
 
-    containers = {}
+    settings = _settings()
 
-    for name, options in settings.SENTRY_DEVSERVICES.items():
-        options = options.copy()
-        test_fn = options.pop("only_if", None)
-        if test_fn and not test_fn(settings, sentry_options):
-            click.secho("! Skipping {} due to only_if condition".format(name), err=True, fg="cyan")
-            continue
+    containers = {}
 
-        options["network"] = project
-        options["detach"] = True
-        options["name"] = project + "_" + name
-        options.setdefault("ports", {})
-        options.setdefault("environment", {})
-        options.setdefault("restart_policy", {"Name": "on-failure"})
-        options["ports"] = ensure_interface(options["ports"])
-        containers[name] = options
+    for name, options in _filtered_devservices(settings, sentry_options):
+        # One merged allocation rather than copy() plus per-key mutation.
+        merged = dict(
+            options,
+            network=project,
+            detach=True,
+            name=project + "_" + name,
+            ports=ensure_interface(options.get("ports") or {}),
+            environment=options.get("environment") or {},
+            restart_policy=options.get("restart_policy") or {"Name": "on-failure"},
+        )
+        merged.pop("only_if", None)
+        containers[name] = merged
 
     return containers
 
 
-def _start_service(client, name, containers, project, fast=False, devserver_override=False):
-    from django.conf import settings
-    import docker
+def _start_service(
+    client,
+    name,
+    containers,
+    project,
+    fast=False,
+    devserver_override=False,
+    local_images=None,
+    known_volumes=None,
+):
+    docker = _docker()
 
-    options = containers[name]
+    # Services start concurrently, and we format environment values against
+    # the shared containers mapping below, so work on our own copy rather
+    # than mutating state another thread may be reading.
+    options = copy.deepcopy(containers[name])
 
     # HACK(mattrobenolt): special handle snuba backend because it needs to
     # handle different values based on the eventstream backend
     # For snuba, we can't run the full suite of devserver, but can only
     # run the api.
-    if name == "snuba" and "snuba" in settings.SENTRY_EVENTSTREAM:
+    if name == "snuba" and "snuba" in _settings().SENTRY_EVENTSTREAM:
         options["environment"].pop("DEFAULT_BROKERS", None)
         options["command"] = ["devserver", "--no-workers"]
 
-    for key, value in options["environment"].items():
-        options["environment"][key] = value.format(containers=containers)
+    # Most environment values are literals; only run the Formatter machinery
+    # over the ones that actually contain a placeholder.
+    options["environment"] = {
+        key: value.format(containers=containers)
+        if isinstance(value, str) and "{" in value
+        else value
+        for key, value in options["environment"].items()
+    }
 
     pull = options.pop("pull", False)
-    if not fast:
+    # up() pre-pulls every image it needs concurrently (and passes the
+    # resulting local_images set), so only callers without that pre-pass
+    # (attach) need to pull here.
+    if not fast and local_images is None:
         if pull:
             click.secho("> Pulling image '%s'" % options["image"], err=True, fg="green")
             client.images.pull(options["image"])
         else:
             # We want make sure to pull everything on the first time,
             # (the image doesn't exist), regardless of pull=True.
-            try:
-                client.images.get(options["image"])
-            except docker.errors.NotFound:
+            if options["image"] not in get_local_image_tags(client):
                 click.secho("> Pulling image '%s'" % options["image"], err=True, fg="green")
                 client.images.pull(options["image"])
 
-    for mount in options.get("volumes", {}).keys():
+    for mount in list(options.get("volumes", {}).keys()):
         if "/" not in mount:
-            get_or_create(client, "volume", project + "_" + mount)
-            options["volumes"][project + "_" + mount] = options["volumes"].pop(mount)
+            vname = project + "_" + mount
+            if known_volumes is None:
+                get_or_create(client, "volume", vname)
+            elif vname not in known_volumes:
+                # up() listed the existing volumes once, so only the missing
+                # ones cost a round-trip here.
+                click.secho("> Creating '%s' volume" % vname, err=True, fg="yellow")
+                client.volumes.create(vname)
+                known_volumes.add(vname)
+            options["volumes"][vname] = options["volumes"].pop(mount)
 
     listening = ""
     if options["ports"]:
-        listening = "(listening: %s)" % ", ".join(map(text_type, options["ports"].values()))
+        listening = "(listening: %s)" % ", ".join(str(v) for v in options["ports"].values())
 
     # If a service is associated with the devserver, then do not run the created container.
     # This was mainly added since it was not desirable for reverse_proxy to occupy port 8000 on the
@@ -259,15 +436,27 @@ def _start_service(client, name, containers, project, fast=False, devserver_over
 @click.argument("service", nargs=-1)
 def down(project, service):
     "Shut down all services."
+    # NOTE: do not call configure() here; this only needs the docker client
+    # and the project prefix, not Django settings or sentry options.
     client = get_docker_client()
 
     prefix = project + "_"
 
-    for container in client.containers.list(all=True):
-        if container.name.startswith(prefix):
-            if not service or container.name[len(prefix) :] in service:
-                click.secho("> Stopping '%s' container" % container.name, err=True, fg="red")
-                container.stop()
+    containers = _matching_containers(client, prefix, service)
+
+    if containers:
+        # One stderr write for the whole batch instead of a secho per
+        # container.
+        click.secho(
+            "\n".join("> Stopping '%s' container" % c.name for c in containers),
+            err=True,
+            fg="red",
+        )
+        # Each stop() blocks up to the grace timeout, so issue them
+        # concurrently rather than paying it once per container.
+        with ThreadPoolExecutor(max_workers=len(containers)) as executor:
+            for future in as_completed(executor.submit(c.stop) for c in containers):
+                future.result()
 
 
 @devservices.command()
@@ -275,30 +464,53 @@ def down(project, service):
 @click.argument("service", nargs=-1)
 def rm(project, service):
     "Delete all services and associated data."
-
-    import docker
+    # NOTE: do not call configure() here; this only needs the docker client
+    # and the project prefix, not Django settings or sentry options.
 
     click.confirm(
         "Are you sure you want to continue?\nThis will delete all of your Sentry related data!",
         abort=True,
     )
 
+    # Deferred until after the prompt so ^C there pays no import cost.
+    docker = _docker()
+
     client = get_docker_client()
 
     prefix = project + "_"
 
-    for container in client.containers.list(all=True):
-        if container.name.startswith(prefix):
-            if not service or container.name[len(prefix) :] in service:
-                click.secho("> Removing '%s' container" % container.name, err=True, fg="red")
-                container.stop()
-                container.remove()
-
-    for volume in client.volumes.list():
-        if volume.name.startswith(prefix):
-            if not service or volume.name[len(prefix) :] in service:
-                click.secho("> Removing '%s' volume" % volume.name, err=True, fg="red")
-                volume.remove()
+    containers = _matching_containers(client, prefix, service)
+
+    if containers:
+        # One stderr write for the whole batch instead of a secho per
+        # container.
+        click.secho(
+            "\n".join("> Removing '%s' container" % c.name for c in containers),
+            err=True,
+            fg="red",
+        )
+        # force=True kills and removes in one daemon operation; the user
+        # already confirmed deletion, so no need for the SIGTERM grace wait.
+        with ThreadPoolExecutor(max_workers=len(containers)) as executor:
+            for future in as_completed(
+                executor.submit(c.remove, force=True, v=True) for c in containers
+            ):
+                future.result()
+
+    volumes = [
+        volume
+        for volume in client.volumes.list(filters={"name": prefix})
+        if volume.name.startswith(prefix)
+        and (not service or volume.name[len(prefix) :] in service)
+    ]
+
+    if volumes:
+        click.secho(
+            "\n".join("> Removing '%s' volume" % v.name for v in volumes), err=True, fg="red"
+        )
+        with ThreadPoolExecutor(max_workers=len(volumes)) as executor:
+            for future in as_completed(executor.submit(v.remove) for v in volumes):
+                future.result()
 
     if not service:
         try:
@@ -0,0 +1,44 @@
+from __future__ import absolute_import
+
+import io
+import struct
+
+from sentry.runner.commands.devservices import _demux_docker_stream
+
+
+def frame(stream, payload):
+    return struct.pack(">BxxxL", stream, len(payload)) + payload
+
+
+def test_demux_copies_frame_payloads():
+    fp = io.BytesIO(frame(1, b"hello ") + frame(2, b"world\n"))
+    out = io.BytesIO()
+    _demux_docker_stream(fp, out)
+    assert out.getvalue() == b"hello world\n"
+
+
+def test_demux_empty_stream():
+    out = io.BytesIO()
+    _demux_docker_stream(io.BytesIO(b""), out)
+    assert out.getvalue() == b""
+
+
+def test_demux_stops_on_truncated_header():
+    fp = io.BytesIO(frame(1, b"ok") + b"\x01\x00\x00")
+    out = io.BytesIO()
+    _demux_docker_stream(fp, out)
+    assert out.getvalue() == b"ok"
+
+
+def test_demux_writes_partial_payload_on_eof():
+    fp = io.BytesIO(struct.pack(">BxxxL", 1, 10) + b"short")
+    out = io.BytesIO()
+    _demux_docker_stream(fp, out)
+    assert out.getvalue() == b"short"
+
+
+def test_demux_copies_payload_larger_than_read_chunk():
+    payload = b"x" * (65536 * 2 + 123)
+    out = io.BytesIO()
+    _demux_docker_stream(io.BytesIO(frame(1, payload)), out)
+    assert out.getvalue() == payload